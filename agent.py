@@ -1,27 +1,306 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import logging
 import os
+import re
+import string
+import tempfile
 import google.adk as adk
 from google.api_core import exceptions as api_exceptions
+from google.auth import exceptions as auth_exceptions
 from google.adk.agents import LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
 from google.adk.tools.api_registry import ApiRegistry
 from google.adk.tools.base_tool import BaseTool
 from google.adk.tools.tool_context import ToolContext
+from google.cloud import bigquery
+from google.genai import types
+from mcp.shared.exceptions import McpError
 from typing import Any, Dict, Optional, Union, Awaitable
 
+from .cache_utils import SqliteTTLCache, TTLCache
+from .prompt_utils import normalize_utterance, select_few_shot_example
+from .sql_utils import canonicalize_sql, parameterize_sql, validate_query
+from .tool_utils import (
+    GENERIC_ERROR_MESSAGE,
+    build_query_response,
+    check_tool_response,
+    get_root_exception,
+    lookup_error_message,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
 # Get project ID from environment variables, which are loaded from .env
 PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
 MCP_SERVER_NAME = f"projects/{PROJECT_ID}/locations/global/mcpServers/google-bigquery.googleapis.com-mcp"
 
-# Initialize the ApiRegistry with the project ID
-api_registry = ApiRegistry(PROJECT_ID)
+# Fully qualified names of the tables the agent is allowed to query.
+_JOBS_TABLE = f"{PROJECT_ID}.test_chat_bot.job_posting_test_data"
+_CANDIDATES_TABLE = f"{PROJECT_ID}.test_chat_bot.candidate_test_data"
+
+# How long a cached answer may be served before the question is asked again.
+# The underlying tables change, so answers are only reused for a short window.
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+# How long the results of an identical SQL query may be reused, as long as
+# neither table has been modified in the meantime.
+SQL_CACHE_TTL_SECONDS = float(os.environ.get("SQL_CACHE_TTL_SECONDS", "300"))
+
+# SQLite file holding cached query results, so they survive restarts.
+SQL_CACHE_PATH = os.environ.get(
+    "SQL_CACHE_PATH", os.path.join(tempfile.gettempdir(), "data_analyst_agent_sql_cache.sqlite3")
+)
+
+# How long a table's last-modified time is trusted before it is fetched again.
+_TABLE_MTIME_TTL_SECONDS = 30
+
+# How long fetching a table's last-modified time may take, including retries.
+# It only validates the query result cache, so it gives up quickly and the
+# query is run instead.
+_TABLE_MTIME_TIMEOUT_SECONDS = 5.0
+
+# Maximum number of rows fetched for a single query. Anything beyond the first
+# page is never downloaded; the response is marked as truncated instead.
+_MAX_RESULT_ROWS = 1000
+
+# How long a query may run before the agent gives up on it. BigQuery is told to
+# cancel the job at the same point, so it doesn't keep running unobserved.
+QUERY_TIMEOUT_SECONDS = float(os.environ.get("QUERY_TIMEOUT_SECONDS", "60"))
+
+# How long a single request to the BigQuery API, such as a dry run, may take.
+_API_TIMEOUT_SECONDS = 30.0
+
+# Queries estimated to scan more than this many bytes are rejected before they
+# run, so the user is asked to narrow the question instead.
+MAX_BYTES_PROCESSED = int(os.environ.get("MAX_BYTES_PROCESSED", str(10 * 1024**3)))
+
+# A single BigQuery client shared by every call, so its connection pool and
+# credentials are reused instead of being set up per query.
+_BQ_CLIENT = bigquery.Client(project=PROJECT_ID)
+
+def _keep_mcp_tool(tool: BaseTool, readonly_context: Any = None) -> bool:
+    """Keeps every MCP tool except execute_sql, which the local execute_sql tool replaces."""
+    return tool.name != "execute_sql"
+
+@functools.lru_cache(maxsize=4)
+def _get_toolset(project_id: str, mcp_server_name: str):
+    """Returns the toolset for an MCP server, querying the ApiRegistry only once
+    per process so recreating the agent doesn't repeat the registry calls."""
+    return ApiRegistry(project_id).get_toolset(mcp_server_name=mcp_server_name, tool_filter=_keep_mcp_tool)
 
 # Get the toolset for the BigQuery MCP server
-registry_tools = api_registry.get_toolset(mcp_server_name=MCP_SERVER_NAME)
+registry_tools = _get_toolset(PROJECT_ID, MCP_SERVER_NAME)
+
+# Final answers keyed on the normalized user question.
+_response_cache = TTLCache(ttl=RESPONSE_CACHE_TTL_SECONDS)
+
+# Query results keyed on the SHA-256 of the canonicalized SQL text, stored
+# together with the table modification times they were computed against.
+_sql_result_cache = SqliteTTLCache(SQL_CACHE_PATH, ttl=SQL_CACHE_TTL_SECONDS)
+_sql_cache_stats = collections.Counter()
+_table_mtime_cache = TTLCache(ttl=_TABLE_MTIME_TTL_SECONDS)
+
+# Queries calling these functions return different results on every run.
+_NON_DETERMINISTIC_SQL = re.compile(
+    r"\b(CURRENT_DATE|CURRENT_DATETIME|CURRENT_TIME|CURRENT_TIMESTAMP|RAND|GENERATE_UUID|SESSION_USER)\b",
+    re.IGNORECASE,
+)
+
+# Turn-scoped state keys used to decide whether an answer may be cached.
+_RESPONSE_CACHE_KEY_STATE = "temp:response_cache_key"
+_BIGQUERY_SUCCEEDED_STATE = "temp:bigquery_succeeded"
+
+# Prefix of the turn-scoped state key holding the table modification times
+# seen before a query was run, suffixed with the function call ID.
+_TABLE_MTIMES_STATE_PREFIX = "temp:table_mtimes:"
+
+
+_READ_ONLY_SQL_MESSAGE = (
+    "Only a single read-only SELECT query can be run. "
+    "Please rewrite the query as one SELECT statement."
+)
+_QUERY_TOO_LARGE_MESSAGE = (
+    "This query would scan too much data. "
+    "Please narrow it down, for example with a date range, location or job title."
+)
+_TIMEOUT_ERROR_MESSAGE = (
+    "The database query took too long to execute and timed out. "
+    "This can happen with complex questions on large datasets. "
+    "Please try asking a more specific question."
+)
+
+# Exception types meaning a local query ran out of time: BigQuery deadlines and
+# exhausted retries, and timeouts waiting on the executor or a socket. The MCP
+# tools report timeouts as an McpError instead, recognised by its error code.
+_TIMEOUT_EXCEPTIONS = (
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.RetryError,
+    asyncio.TimeoutError,
+    concurrent.futures.TimeoutError,
+    TimeoutError,
+)
+
+# User-facing messages for known exception types, built once at import.
+_ERROR_MESSAGES = {
+    api_exceptions.BadRequest: "I was unable to run the query as it seems to be invalid. Please try rephrasing your request.",
+    api_exceptions.Forbidden: "I'm sorry, but I don't have the necessary permissions to access the database. Please check my configuration.",
+    **dict.fromkeys(_TIMEOUT_EXCEPTIONS, _TIMEOUT_ERROR_MESSAGE),
+}
+
+# Error code of the McpError raised when an MCP request times out.
+_MCP_REQUEST_TIMEOUT = 408
+
+
+def _is_execute_sql(tool: BaseTool) -> bool:
+    """Returns whether the tool runs SQL queries against BigQuery."""
+    return tool.name == "execute_sql"
+
+
+def _sql_cache_key(query: str) -> str:
+    return hashlib.sha256(canonicalize_sql(query).encode("utf-8")).hexdigest()
+
+
+async def _get_table_mtimes() -> list[str]:
+    """Returns the last-modified times of the queried tables, cached briefly."""
+    table_ids = (_JOBS_TABLE, _CANDIDATES_TABLE)
+    # Read the cache once up front: an entry could expire while the missing
+    # tables are being fetched, so it must not be read again afterwards.
+    mtimes = {table_id: _table_mtime_cache.get(table_id) for table_id in table_ids}
+    missing = [table_id for table_id, mtime in mtimes.items() if mtime is None]
+    if missing:
+        # The BigQuery client is synchronous, so run the lookups in the default
+        # executor concurrently instead of blocking the event loop for each in turn.
+        loop = asyncio.get_running_loop()
+        get_table = functools.partial(
+            _BQ_CLIENT.get_table,
+            retry=bigquery.DEFAULT_RETRY.with_deadline(_TABLE_MTIME_TIMEOUT_SECONDS),
+            timeout=_TABLE_MTIME_TIMEOUT_SECONDS,
+        )
+        tables = await asyncio.gather(
+            *(loop.run_in_executor(None, get_table, table_id) for table_id in missing)
+        )
+        for table_id, table in zip(missing, tables):
+            mtimes[table_id] = table.modified.isoformat()
+            _table_mtime_cache.set(table_id, mtimes[table_id])
+    return [mtimes[table_id] for table_id in table_ids]
+
+
+def _estimate_bytes_processed(query: str) -> int:
+    """Returns how many bytes a query would scan, using a free dry run."""
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    job = _BQ_CLIENT.query(query, job_config=job_config, timeout=_API_TIMEOUT_SECONDS)
+    return job.total_bytes_processed or 0
+
+
+def _run_query(query: str) -> Dict[str, Any]:
+    """Runs a query and returns its rows.
+
+    query_and_wait submits the query and fetches the first page of results in a
+    single jobs.query call, instead of inserting a job and polling for it. The
+    query text has already been canonicalized by validate_sql, so repeats of a
+    question hit BigQuery's own results cache. LIKE patterns and LOWER()
+    arguments are bound as parameters rather than inlined.
+    """
+    query, values = parameterize_sql(query)
+    parameters = [bigquery.ScalarQueryParameter(name, "STRING", value) for name, value in values]
+    job_config = bigquery.QueryJobConfig(
+        use_query_cache=True,
+        query_parameters=parameters,
+        job_timeout_ms=int(QUERY_TIMEOUT_SECONDS * 1000),
+    )
+    # wait_timeout raises concurrent.futures.TimeoutError, which
+    # handle_bigquery_tool_error reports as a timeout, instead of leaving an
+    # executor thread blocked on a runaway query.
+    row_iterator = _BQ_CLIENT.query_and_wait(
+        query,
+        job_config=job_config,
+        api_timeout=_API_TIMEOUT_SECONDS,
+        wait_timeout=QUERY_TIMEOUT_SECONDS,
+        max_results=_MAX_RESULT_ROWS,
+        page_size=_MAX_RESULT_ROWS,
+    )
+    # No LIMIT is added to the query, so total_rows is the number of rows that
+    # matched, not just the number fetched.
+    rows = [row.values() for row in row_iterator]
+    return build_query_response([field.name for field in row_iterator.schema], rows, row_iterator.total_rows)
+
+
+async def validate_sql(
+    tool: BaseTool,
+    args: Dict[str, Any],
+    tool_context: ToolContext,
+) -> Optional[Dict[str, Any]]:
+    """Rejects anything but a single read-only query before it reaches BigQuery."""
+    if not _is_execute_sql(tool):
+        return None
+    query = args.get("query")
+    if not query:
+        return None
+
+    query = validate_query(query)
+    if query is None:
+        return {"error_message": _READ_ONLY_SQL_MESSAGE}
+
+    # The rewritten query is what the next callbacks and the tool will see.
+    args["query"] = query
+    return None
+
+
+async def before_bigquery_tool_call(
+    tool: BaseTool,
+    args: Dict[str, Any],
+    tool_context: ToolContext,
+) -> Optional[Dict[str, Any]]:
+    """Serves cached results for an identical SQL query if the tables haven't changed."""
+    if not _is_execute_sql(tool):
+        return None
+    query = args.get("query")
+    if not query or _NON_DETERMINISTIC_SQL.search(query):
+        return None
+
+    try:
+        table_mtimes = await _get_table_mtimes()
+    except (api_exceptions.GoogleAPIError, auth_exceptions.GoogleAuthError) as e:
+        # Without modification times the cache can't be validated; run the query.
+        # Errors raised here would fail the whole turn rather than reach
+        # handle_bigquery_tool_error, so they must not escape.
+        _LOGGER.warning("Fetching table modification times failed, skipping the SQL cache: %s", e)
+        return None
+
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(None, _sql_result_cache.get, _sql_cache_key(query))
+    if cached is not None and cached[1] == table_mtimes:
+        _sql_cache_stats["hit"] += 1
+        _LOGGER.debug("SQL cache HIT (%s)", _sql_cache_stats)
+        return cached[0]
+    _sql_cache_stats["miss"] += 1
+    _LOGGER.debug("SQL cache MISS (%s)", _sql_cache_stats)
+    tool_context.state[_TABLE_MTIMES_STATE_PREFIX + tool_context.function_call_id] = table_mtimes
+    return None
 
-def _get_root_exception(e: Exception) -> Exception:
-    """Recursively unwraps an exception to find the root cause."""
-    if e.__cause__ is None:
-        return e
-    return _get_root_exception(e.__cause__)
+
+async def execute_sql(query: str) -> Dict[str, Any]:
+    """Runs a read-only GoogleSQL query against BigQuery and returns its results.
+
+    Args:
+        query: A single SELECT query. Tables must be referenced by their fully
+            qualified names.
+
+    Returns:
+        The column names and rows of the result. If more rows matched than
+        were returned, total_rows holds the full count and truncated is true.
+    """
+    # The BigQuery client is synchronous, so run it in the default executor.
+    loop = asyncio.get_running_loop()
+    bytes_processed = await loop.run_in_executor(None, _estimate_bytes_processed, query)
+    if bytes_processed > MAX_BYTES_PROCESSED:
+        return {"error_message": _QUERY_TOO_LARGE_MESSAGE}
+    return await loop.run_in_executor(None, _run_query, query)
 
 
 async def handle_bigquery_tool_error(
@@ -31,32 +310,15 @@ async def handle_bigquery_tool_error(
     error: Exception,
 ) -> Optional[Dict[str, Any]]:
     """Custom error handler for BigQuery tool calls."""
-    logger = tool_context._invocation_context.logger
-    logger.error(f"Error executing tool '{tool.name}' with args {args}: {error}")
-
-    # Unwrap the exception to find the root cause.
-    root_exception = _get_root_exception(error)
-    if isinstance(root_exception, api_exceptions.BadRequest):
-        return {
-            "error_message": "I was unable to run the query as it seems to be invalid. Please try rephrasing your request."
-        }
-    if isinstance(root_exception, api_exceptions.Forbidden):
-        return {
-            "error_message": "I'm sorry, but I don't have the necessary permissions to access the database. Please check my configuration."
-        }
-
-    # Check if the error is a timeout and provide a specific message
-    if "Timed out" in str(error):
-        error_message = (
-            "The database query took too long to execute and timed out. "
-            "This can happen with complex questions on large datasets. "
-            "Please try asking a more specific question."
-        )
+    _LOGGER.error("Error executing tool '%s' with args %s: %s", tool.name, args, error)
+
+    # Unwrap the exception to find the root cause and look up the message for
+    # the most specific exception type that has one.
+    root_exception = get_root_exception(error)
+    if isinstance(root_exception, McpError) and root_exception.error.code == _MCP_REQUEST_TIMEOUT:
+        error_message = _TIMEOUT_ERROR_MESSAGE
     else:
-        error_message = (
-            "I encountered an error while trying to query the database. "
-            "Please try rephrasing your request."
-        )
+        error_message = lookup_error_message(root_exception, _ERROR_MESSAGES, GENERIC_ERROR_MESSAGE)
 
     # Return a user-friendly error message. The agent will then present this to the user.
     return {"error_message": error_message}
@@ -68,42 +330,77 @@ async def after_bigquery_tool_call(
     tool_response: Union[Dict[str, Any], list[Dict[str, Any]]],
 ) -> Optional[Dict[str, Any]]:
     """Custom handler for BigQuery tool calls to handle errors and empty results."""
-    if isinstance(tool_response, dict):
-        # Handle errors returned by the BigQuery tool.
-        if tool_response.get("status") == "ERROR":
-            logger = tool_context._invocation_context.logger
-            error_details = tool_response.get("error_details", "Unknown error")
-            logger.error(f"BigQuery tool returned an error: {error_details}")
-            return {
-                "error_message": "I encountered an error while trying to query the database. Please try rephrasing your request."
-            }
-
-        # Handle empty results for SELECT queries.
-        if "rows" in tool_response and not tool_response["rows"]:
-            return {
-                "message": "I couldn't find any information matching your criteria in the database. Please try a different search or broaden your criteria."
-            }
-
-    # Handle empty results when the response is a list.
-    if isinstance(tool_response, list) and not tool_response:
-        return {
-            "message": "I couldn't find any information matching your criteria in the database. Please try a different search or broaden your criteria."
-        }
+    replacement = check_tool_response(tool_response)
+    if replacement is not None:
+        return replacement
+
+    # Cache the results against the table modification times seen before the query ran.
+    table_mtimes = tool_context.state.get(_TABLE_MTIMES_STATE_PREFIX + tool_context.function_call_id)
+    if table_mtimes is not None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, _sql_result_cache.set, _sql_cache_key(args["query"]), [tool_response, table_mtimes]
+        )
+
+    # Only answers backed by real query results are worth caching, not ones
+    # that merely looked at metadata such as table lists or schemas.
+    if _is_execute_sql(tool):
+        tool_context.state[_BIGQUERY_SUCCEEDED_STATE] = True
     return None # Let the original response pass through if not empty
 
-root_agent = LlmAgent(
-  name='data_analyst_agent',
-  model='gemini-2.5-flash',
-  description=(
-      'An agent that can answer questions about job openings and candidates from a database.'
-  ),
-  instruction=(
+async def before_model_call(
+    callback_context: CallbackContext,
+    llm_request: LlmRequest,
+) -> Optional[LlmResponse]:
+    """Serves a cached answer for a repeated question, skipping the LLM and BigQuery.
+    Otherwise adds the few-shot example closest to the question to the request."""
+    user_content = callback_context.user_content
+    text = "".join(part.text or "" for part in user_content.parts or []) if user_content else ""
+    utterance = normalize_utterance(text)
+
+    # Only standalone questions are cached. Follow-ups ("what about Boston?")
+    # depend on the conversation so far and can't be answered from the cache.
+    if len(llm_request.contents) == 1 and utterance:
+        key = f"{_INSTRUCTION_SHA}:{utterance}"
+        cached_content = _response_cache.get(key)
+        if cached_content is not None:
+            return LlmResponse(content=cached_content.model_copy(deep=True))
+        callback_context.state[_RESPONSE_CACHE_KEY_STATE] = key
+
+    # The example goes after the static instruction, so picking a different one
+    # per question leaves the cacheable prefix untouched.
+    llm_request.append_instructions([_FEW_SHOT_HEADER + select_few_shot_example(utterance, _FEW_SHOT_EXAMPLES, _FEW_SHOT_EXAMPLE_WORDS)])
+    return None
+
+async def after_model_call(
+    callback_context: CallbackContext,
+    llm_response: LlmResponse,
+) -> Optional[LlmResponse]:
+    """Caches the final answer to a standalone question that was backed by query results."""
+    key = callback_context.state.get(_RESPONSE_CACHE_KEY_STATE)
+    if not key or not callback_context.state.get(_BIGQUERY_SUCCEEDED_STATE):
+        return None
+    content = llm_response.content
+    if llm_response.partial or not content or not content.parts:
+        return None
+    # Intermediate responses that call a tool are not final answers.
+    if any(part.function_call for part in content.parts):
+        return None
+    _response_cache.set(key, content.model_copy(deep=True))
+    return None
+
+# The instruction is built once at import. It holds only the schema and rules,
+# which never change for a given project, so every request starts with the same
+# byte-identical prefix and Gemini's implicit prompt caching can reuse it.
+# Keep anything request-specific (timestamps, user data) out of this prefix.
+# The table names are filled in with a single template substitution.
+_INSTRUCTION_TEMPLATE = string.Template(
     'You are a data analyst. Your goal is to help users find information about'
     ' job openings and candidates from a BigQuery database.\n'
     'All questions should be answered by constructing and running SQL queries against the tables'
-    f' `{PROJECT_ID}.test_chat_bot.job_posting_test_data` and `{PROJECT_ID}.test_chat_bot.candidate_test_data`.\n\n'
+    ' `${jobs_table}` and `${candidates_table}`.\n\n'
     'The table schemas are as follows:\n\n'
-    f'Table: `{PROJECT_ID}.test_chat_bot.job_posting_test_data`\n'
+    'Table: `${jobs_table}`\n'
     '- job_id (STRING): Unique identifier for the job posting.\n'
     '- job_title (STRING): The title of the job posting.\n'
     '- city (STRING): The city and/or state of the job.\n'
@@ -111,7 +408,7 @@ root_agent = LlmAgent(
     '- salary_min (FLOAT): The minimum salary for the role.\n'
     '- salary_max (FLOAT): The maximum salary for the role.\n'
     '- post_date (DATE): The date the job was posted.\n'
-    f'\nTable: `{PROJECT_ID}.test_chat_bot.candidate_test_data`\n'
+    '\nTable: `${candidates_table}`\n'
     '- candidate_id (STRING): Unique identifier for the candidate.\n'
     '- job_id (STRING): The job ID the candidate applied for. This can be used to join with the job_posting_test_data table.\n'
     '- first_name (STRING): The first name of the candidate.\n'
@@ -123,39 +420,77 @@ root_agent = LlmAgent(
     '- application_status (DATE): The status of the candidate application (Applied, Rejected, etc.).\n'
     '- referral_source (STRING): The source from where the candidate applied (e.g., LinkedIn, Indeed).\n'
     '- skills (STRING): A comma-separated list of the candidate\'s skills.\n\n'
-    'ensure that whenever applying filters in the BigQuery queries always do lower(column_name) like lower(\'user provided filter criteria\') instead of simple equal to (=) filter unless the user specifically requests to apply exact string or value match\n'
+    'When filtering on the text columns `job_title`, `city`, `country` or `skills`, use SEARCH(column_name, \'user provided filter criteria\'),'
+    ' which matches the terms case-insensitively and can use the search indexes on these columns.'
+    ' Do not use LIKE \'%...%\' patterns, which scan the whole column.'
+    ' Only if the user specifically requests an exact string or value match, use lower(column_name) = lower(\'value\') instead.\n'
     'When a user asks about a country, you must use the `country` column in your SQL query. '
     'When a user asks about a city or state, use the `city` column.\n'
     'To get insights about candidates for a job, you must join the two tables on `job_id`.\n'
     'If a query returns no results, inform the user that no matching information was found.'
+    ' If a query result is marked as truncated, tell the user that only the first rows out of `total_rows` are shown,'
+    ' and suggest aggregating or filtering further.\n'
     'If an error occurs during the query, inform the user about the error and suggest rephrasing the question.\n\n'
-    'Here are some examples of how to respond to user queries:\n\n'
-    'User: How many Data Engineer roles are open in Atlanta?\n'
-    'Model: Thought: I need to count the rows in the jobs table where the title is \'Data Engineer\' and the country is \'Atlanta\'.\n'
-    'Tool Call: google-bigquery.googleapis.com-mcp:execute_sql(query="SELECT count(*) as job_count FROM '
-    f'`{PROJECT_ID}.test_chat_bot.job_posting_test_data` WHERE job_title = \'Data Engineer\' AND city = \'Atlanta\'")\n\n'
-    'User: What is the average salary for senior roles?\n'
-    'Model: Thought: I will filter for roles containing \'Senior\' and calculate the average of the salary column.\n'
-    'Tool Call: google-bigquery.googleapis.com-mcp:execute_sql(query="SELECT AVG(salary_max) as avg_salary FROM '
-    f'`{PROJECT_ID}.test_chat_bot.job_posting_test_data` WHERE job_title LIKE \'%Senior%\'")\n\n'
-    'User: How many candidates applied for Data Scientist roles?\n'
-    'Model: Thought: I need to join the job postings and candidate tables on job_id, filter for \'Data Scientist\' roles, and then count the number of candidates.\n'
-    f'Tool Call: google-bigquery.googleapis.com-mcp:execute_sql(query="SELECT COUNT(c.candidate_id) FROM `{PROJECT_ID}.test_chat_bot.candidate_test_data` c JOIN `{PROJECT_ID}.test_chat_bot.job_posting_test_data` j ON c.job_id = j.job_id WHERE j.job_title = \'Data Scientist\'")'
+)
+
+# Few-shot examples. Only the one closest to the user's question is sent with
+# each request, appended after the static prefix so it doesn't affect caching.
+_FEW_SHOT_HEADER = 'Here is an example of how to respond to user queries:\n\n'
+_FEW_SHOT_EXAMPLE_TEMPLATES = (
+    string.Template(
+        'User: How many Data Engineer roles are open in Atlanta?\n'
+        'Model: Thought: I need to count the rows in the jobs table where the title matches \'Data Engineer\' and the city matches \'Atlanta\'.\n'
+        'Tool Call: execute_sql(query="SELECT count(*) as job_count FROM '
+        '`${jobs_table}` WHERE SEARCH(job_title, \'Data Engineer\') AND SEARCH(city, \'Atlanta\')")'
+    ),
+    string.Template(
+        'User: What is the average salary for senior roles?\n'
+        'Model: Thought: I will filter for roles containing \'Senior\' and calculate the average of the salary column.\n'
+        'Tool Call: execute_sql(query="SELECT AVG(salary_max) as avg_salary FROM '
+        '`${jobs_table}` WHERE SEARCH(job_title, \'Senior\')")'
+    ),
+    string.Template(
+        'User: How many candidates applied for Data Scientist roles?\n'
+        'Model: Thought: I need to join the job postings and candidate tables on job_id, filter for \'Data Scientist\' roles, and then count the number of candidates.\n'
+        'Tool Call: execute_sql(query="SELECT COUNT(c.candidate_id) FROM `${candidates_table}` c JOIN `${jobs_table}` j ON c.job_id = j.job_id WHERE SEARCH(j.job_title, \'Data Scientist\')")'
+    ),
+)
+
+_TABLE_NAMES = {"jobs_table": _JOBS_TABLE, "candidates_table": _CANDIDATES_TABLE}
+_INSTRUCTION = _INSTRUCTION_TEMPLATE.substitute(_TABLE_NAMES)
+_FEW_SHOT_EXAMPLES = tuple(template.substitute(_TABLE_NAMES) for template in _FEW_SHOT_EXAMPLE_TEMPLATES)
+
+# The words of each example's question, compared against the user's question.
+_FEW_SHOT_EXAMPLE_WORDS = tuple(
+    frozenset(normalize_utterance(example.split("\n", 1)[0].removeprefix("User: ")).split()) for example in _FEW_SHOT_EXAMPLES
+)
+
+
+# Identifies the prompt in cache keys, so answers cached under a different
+# prompt are never served.
+_INSTRUCTION_SHA = hashlib.sha256("".join((_INSTRUCTION, *_FEW_SHOT_EXAMPLES)).encode("utf-8")).hexdigest()
+
+root_agent = LlmAgent(
+  name='data_analyst_agent',
+  model='gemini-2.5-flash',
+  description=(
+      'An agent that can answer questions about job openings and candidates from a database.'
   ),
-  # Provide the toolset from the ApiRegistry to the agent
-  tools=[registry_tools],
+  instruction=_INSTRUCTION,
+  # Provide the toolset from the ApiRegistry to the agent, with its execute_sql
+  # replaced by the local tool that runs queries with the BigQuery client.
+  tools=[registry_tools, execute_sql],
+  before_tool_callback=[validate_sql, before_bigquery_tool_call],
   on_tool_error_callback=handle_bigquery_tool_error,
   after_tool_callback=after_bigquery_tool_call,
+  before_model_callback=before_model_call,
+  after_model_callback=after_model_call,
 
-  #You can adjust how the underlying LLM generates responses using generate_content_config.
-#   generate_content_config=types.GenerateContentConfig(
-#         temperature=0.2, # More deterministic output
-#         max_output_tokens=250,
-#         safety_settings=[
-#             types.SafetySetting(
-#                 category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-#                 threshold=types.HarmBlockThreshold.BLOCK_LOW_AND_ABOVE,
-#             )
-#         ]
-#     )
-)
\ No newline at end of file
+  # Deterministic generation, so the same question produces the same SQL and
+  # the prompt, response and query result caches actually get hit.
+  # You can adjust how the underlying LLM generates responses here, e.g. with safety_settings.
+  generate_content_config=types.GenerateContentConfig(
+      temperature=0.0,
+      top_p=1.0,
+  ),
+)
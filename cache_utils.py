@@ -0,0 +1,111 @@
+"""Caches the agent keeps in front of the LLM and BigQuery."""
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """A small in-process cache whose entries expire after a fixed time."""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._data: Dict[str, tuple[float, Any]] = {}
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._data.pop(key, None)
+        if len(self._data) >= self._maxsize:
+            # Dicts keep insertion order, so the first key is the oldest entry.
+            del self._data[next(iter(self._data))]
+        self._data[key] = (time.monotonic() + self._ttl, value)
+
+
+class SqliteTTLCache:
+    """A cache of JSON-serializable values stored in a SQLite file, whose entries
+    expire after a fixed time and survive process restarts.
+
+    The cache fails open: any SQLite or serialization error is logged and
+    treated as a miss or a skipped write, so a locked, read-only or corrupt
+    file, or a value orjson can't handle, never fails a query. Calls block on
+    disk I/O and should be run in an executor.
+    """
+
+    def __init__(self, path: str, ttl: float, maxsize: int = 1024):
+        self._path = path
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._conn: Optional[sqlite3.Connection] = None
+        # Executor threads share the one connection.
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connect on first use, so a bad path can't stop the module from importing.
+        if self._conn is None:
+            conn = sqlite3.connect(self._path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            # WAL lets other processes read while one of them writes.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Any:
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                value, expires_at = row
+                if expires_at < time.time():
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    return None
+        except sqlite3.Error as e:
+            _LOGGER.warning("Reading the SQL result cache failed, treating it as a miss: %s", e)
+            return None
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError as e:
+            _LOGGER.warning("Cached SQL result is corrupt, treating it as a miss: %s", e)
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            data = orjson.dumps(value)
+        except orjson.JSONEncodeError as e:
+            _LOGGER.warning("SQL result can't be cached, skipping the write: %s", e)
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                now = time.time()
+                conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, data, now + self._ttl),
+                )
+                # Every entry has the same TTL, so the ones expiring last are the newest.
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self._maxsize,),
+                )
+        except sqlite3.Error as e:
+            _LOGGER.warning("Writing to the SQL result cache failed: %s", e)
@@ -0,0 +1,24 @@
+"""Helpers for matching user questions, for caching answers and picking examples."""
+import re
+from typing import AbstractSet, Sequence
+
+# Filler words that never change what is being asked.
+_FILLER_WORDS = frozenset({"a", "an", "the", "please"})
+
+
+def normalize_utterance(text: str) -> str:
+    """Reduces a question to lowercase words without punctuation or filler words,
+    so trivially different phrasings share a cache key."""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return " ".join(word for word in words if word not in _FILLER_WORDS)
+
+
+def select_few_shot_example(
+    utterance: str, examples: Sequence[str], example_words: Sequence[AbstractSet[str]]
+) -> str:
+    """Returns the example whose question shares the most words with the
+    normalized utterance, given the words of each example's question. Ties go
+    to the earliest example."""
+    words = set(utterance.split())
+    best = max(range(len(examples)), key=lambda i: len(words & example_words[i]))
+    return examples[best]
@@ -0,0 +1,15 @@
+-- One-time migration creating the search indexes behind the SEARCH() filters
+-- the agent is instructed to use. Run it with the agent's project as the
+-- default project:
+--
+--   bq query --use_legacy_sql=false --project_id="$GOOGLE_CLOUD_PROJECT" < sql/create_search_indexes.sql
+--
+-- BigQuery only populates search indexes on tables of 10 GB or more (unless
+-- the project uses its own reservation). SEARCH() still works on smaller
+-- tables without one.
+
+CREATE SEARCH INDEX IF NOT EXISTS job_posting_search_index
+ON test_chat_bot.job_posting_test_data (job_title, city, country);
+
+CREATE SEARCH INDEX IF NOT EXISTS candidate_search_index
+ON test_chat_bot.candidate_test_data (skills);
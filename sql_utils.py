@@ -0,0 +1,81 @@
+"""Helpers for inspecting and rewriting the SQL the agent generates.
+
+These only tokenize quoted literals, identifiers and comments; they are not a
+SQL parser, so they err on the side of rejecting or leaving a query unchanged.
+"""
+import re
+from typing import List, Optional, Tuple
+
+# A quoted string, bytes or raw literal, whose r or b prefix is left outside the
+# match, or a quoted identifier. Triple-quoted literals come first so their
+# quotes aren't mistaken for empty literals.
+_LITERAL_PATTERN = (
+    r"'''(?:[^'\\]|\\.|'(?!''))*'''|"
+    r'"""(?:[^"\\]|\\.|"(?!""))*"""|'
+    r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`"""
+)
+
+# Quoted literals and identifiers, which must be kept verbatim, or runs of
+# whitespace and comments, which don't change what a query does.
+_SQL_TOKEN = re.compile(rf"({_LITERAL_PATTERN})|(?:\s|--[^\n]*|#[^\n]*|/\*.*?\*/)+", re.DOTALL)
+
+# Quoted literals and identifiers alone, blanked out before checking what a
+# query does since they can contain any text.
+_SQL_LITERAL = re.compile(_LITERAL_PATTERN, re.DOTALL)
+_READ_ONLY_SQL = re.compile(r"^[\s(]*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITE_SQL = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|CREATE|DROP|ALTER|TRUNCATE|GRANT|REVOKE|EXPORT|LOAD|CALL|EXECUTE|DECLARE|BEGIN)\b",
+    re.IGNORECASE,
+)
+
+# Single-quoted string literals that are LIKE patterns or LOWER() arguments,
+# which are always STRING and can be bound as query parameters; other literals,
+# including triple-quoted and prefixed ones, are matched only so they're skipped
+# over. Literals compared with = may be coerced to DATE or other types by
+# BigQuery, so they stay inline.
+_PARAMETERIZABLE_SQL_LITERAL = re.compile(
+    rf"(\bLIKE\s+|\bLOWER\s*\(\s*)'([^'\\]*)'(?!')|{_LITERAL_PATTERN}",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def canonicalize_sql(query: str) -> str:
+    """Strips comments and collapses whitespace outside of quoted literals, so
+    queries differing only in formatting share a cache key."""
+    canonical = _SQL_TOKEN.sub(lambda match: match.group(1) or " ", query)
+    return canonical.strip().rstrip(";").rstrip()
+
+
+def validate_query(query: str) -> Optional[str]:
+    """Returns the canonicalized query to run, or None if it isn't a single
+    read-only query.
+
+    No LIMIT is added: the rows fetched are capped when the results are read,
+    which still reports how many rows matched in total.
+    """
+    query = canonicalize_sql(query)
+    code = _SQL_LITERAL.sub("''", query)
+    if not _READ_ONLY_SQL.match(code) or ";" in code or _WRITE_SQL.search(code):
+        return None
+    return query
+
+
+def parameterize_sql(query: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """Replaces string literals used as LIKE patterns or LOWER() arguments with
+    named parameters @p0, @p1, ..., returning the query and (name, value) pairs.
+
+    The prompt tells the model to filter with SEARCH(), whose literals stay
+    inline, and to avoid LIKE, so in practice only exact-match
+    LOWER(column) = LOWER('value') filters are bound. Most queries therefore
+    still differ in their text from one filter value to the next.
+    """
+    parameters = []
+
+    def replace(match: re.Match) -> str:
+        if match.group(1) is None:
+            return match.group(0)
+        name = f"p{len(parameters)}"
+        parameters.append((name, match.group(2)))
+        return f"{match.group(1)}@{name}"
+
+    return _PARAMETERIZABLE_SQL_LITERAL.sub(replace, query), parameters
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The helpers under test are imported as top-level modules, without going
+# through the package __init__, which needs Google Cloud credentials.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,93 @@
+import decimal
+
+import cache_utils
+from cache_utils import SqliteTTLCache, TTLCache
+
+
+def test_ttl_cache_returns_value_until_it_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_utils.time, "monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.set("k", "v")
+    now[0] = 110.0
+    assert cache.get("k") == "v"
+    now[0] = 110.1
+    assert cache.get("k") is None
+
+
+def test_ttl_cache_evicts_oldest_entry():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_resetting_a_key_makes_it_newest():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 3)
+    cache.set("c", 4)
+    assert cache.get("a") == 3
+    assert cache.get("b") is None
+
+
+def test_sqlite_cache_round_trips_values(tmp_path):
+    cache = SqliteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    value = [{"columns": ["a"], "rows": [[1, "x", None]]}, ["2024-01-01T00:00:00"]]
+    cache.set("k", value)
+    assert cache.get("k") == value
+    assert cache.get("missing") is None
+
+
+def test_sqlite_cache_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SqliteTTLCache(path, ttl=60).set("k", [1, 2])
+    assert SqliteTTLCache(path, ttl=60).get("k") == [1, 2]
+
+
+def test_sqlite_cache_expires_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_utils.time, "time", lambda: now[0])
+    cache = SqliteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=10)
+    cache.set("k", 1)
+    now[0] = 1010.0
+    assert cache.get("k") == 1
+    now[0] = 1010.1
+    assert cache.get("k") is None
+
+
+def test_sqlite_cache_keeps_only_the_newest_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_utils.time, "time", lambda: now[0])
+    cache = SqliteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=60, maxsize=2)
+    for i, key in enumerate("abc"):
+        now[0] = 1000.0 + i
+        cache.set(key, i)
+    assert cache.get("a") is None
+    assert cache.get("b") == 1
+    assert cache.get("c") == 2
+
+
+def test_sqlite_cache_fails_open_on_unusable_path(tmp_path):
+    cache = SqliteTTLCache(str(tmp_path / "missing" / "cache.sqlite3"), ttl=60)
+    cache.set("k", 1)
+    assert cache.get("k") is None
+
+
+def test_sqlite_cache_skips_values_it_cannot_serialize(tmp_path):
+    cache = SqliteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    cache.set("k", [decimal.Decimal("1.5")])
+    cache.set("b", [b"bytes"])
+    assert cache.get("k") is None
+    assert cache.get("b") is None
+
+
+def test_sqlite_cache_treats_corrupt_values_as_misses(tmp_path):
+    cache = SqliteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    cache.set("k", [1])
+    cache._connect().execute("UPDATE cache SET value = ? WHERE key = ?", (b"{not json", "k"))
+    assert cache.get("k") is None
@@ -0,0 +1,28 @@
+from prompt_utils import normalize_utterance, select_few_shot_example
+
+
+def test_normalize_utterance_drops_case_punctuation_and_filler_words():
+    assert normalize_utterance("Please, how many of the Data Engineer roles are open?") == (
+        "how many of data engineer roles are open"
+    )
+
+
+def test_normalize_utterance_keeps_words_that_change_the_question():
+    assert normalize_utterance("Show all jobs") != normalize_utterance("Show jobs")
+
+
+def test_select_few_shot_example_picks_most_overlapping_question():
+    examples = ("count example", "salary example", "candidates example")
+    example_words = (
+        frozenset({"how", "many", "roles", "open"}),
+        frozenset({"average", "salary", "senior", "roles"}),
+        frozenset({"candidates", "applied", "roles"}),
+    )
+    assert select_few_shot_example("average salary of roles", examples, example_words) == "salary example"
+    assert select_few_shot_example("which candidates applied", examples, example_words) == "candidates example"
+
+
+def test_select_few_shot_example_falls_back_to_first_example():
+    examples = ("first", "second")
+    example_words = (frozenset({"a"}), frozenset({"b"}))
+    assert select_few_shot_example("", examples, example_words) == "first"
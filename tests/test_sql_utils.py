@@ -0,0 +1,115 @@
+from sql_utils import canonicalize_sql, parameterize_sql, validate_query
+
+
+def test_canonicalize_sql_strips_comments_and_collapses_whitespace():
+    query = "SELECT  a,\n  b -- the b column\nFROM t /* block\ncomment */ WHERE c = 1 # trailing\n"
+    assert canonicalize_sql(query) == "SELECT a, b FROM t WHERE c = 1"
+
+
+def test_canonicalize_sql_keeps_literals_and_identifiers_verbatim():
+    query = "SELECT 'a  -- b', \"x  # y\" FROM `my-project.ds.t  1`"
+    assert canonicalize_sql(query) == query
+
+
+def test_canonicalize_sql_drops_trailing_semicolons():
+    assert canonicalize_sql("SELECT 1 ;\n") == "SELECT 1"
+
+
+def test_validate_query_returns_canonical_query_without_adding_a_limit():
+    assert validate_query("SELECT *\n  FROM t -- all rows\n;") == "SELECT * FROM t"
+    assert validate_query("select * from t limit 5") == "select * from t limit 5"
+
+
+def test_validate_query_leaves_limits_in_subqueries_alone():
+    query = "SELECT * FROM (SELECT * FROM t LIMIT 5000) x"
+    assert validate_query(query) == query
+
+
+def test_validate_query_accepts_with_and_nested_parens():
+    assert validate_query("WITH x AS (SELECT 1) SELECT * FROM x") == "WITH x AS (SELECT 1) SELECT * FROM x"
+    assert validate_query("( (SELECT 1) UNION ALL (SELECT 2) )") == "( (SELECT 1) UNION ALL (SELECT 2) )"
+
+
+def test_validate_query_accepts_semicolon_inside_literal():
+    assert validate_query("SELECT 'a;b' FROM t LIMIT 1") == "SELECT 'a;b' FROM t LIMIT 1"
+
+
+def test_validate_query_accepts_write_keywords_inside_literals_and_identifiers():
+    query = "SELECT `delete`, \"drop\" FROM `p.ds.insert` WHERE note = 'please DROP TABLE t' LIMIT 1"
+    assert validate_query(query) == query
+
+
+def test_validate_query_rejects_writes():
+    for query in (
+        "DROP TABLE t",
+        "INSERT INTO t VALUES (1)",
+        "UPDATE t SET a = 1",
+        "DELETE FROM t WHERE true",
+        "WITH x AS (SELECT 1) INSERT INTO t SELECT * FROM x",
+        "CREATE TABLE t AS SELECT 1",
+    ):
+        assert validate_query(query) is None, query
+
+
+def test_validate_query_rejects_multiple_statements():
+    assert validate_query("SELECT 1; DELETE FROM t") is None
+    assert validate_query("SELECT 1; SELECT 2") is None
+
+
+def test_validate_query_rejects_write_hidden_after_comment():
+    assert validate_query("SELECT 1 -- comment\n; DROP TABLE t") is None
+
+
+def test_parameterize_sql_binds_like_patterns():
+    assert parameterize_sql("SELECT * FROM t WHERE job_title LIKE '%Senior%'") == (
+        "SELECT * FROM t WHERE job_title LIKE @p0",
+        [("p0", "%Senior%")],
+    )
+
+
+def test_parameterize_sql_binds_lower_arguments():
+    assert parameterize_sql("SELECT * FROM t WHERE LOWER(city) = lower( 'Atlanta')") == (
+        "SELECT * FROM t WHERE LOWER(city) = lower( @p0)",
+        [("p0", "Atlanta")],
+    )
+
+
+def test_parameterize_sql_numbers_parameters_in_order():
+    query = "SELECT * FROM t WHERE LOWER(a) = LOWER('x') AND b LIKE 'y%' AND LOWER(c) LIKE LOWER('%z')"
+    assert parameterize_sql(query) == (
+        "SELECT * FROM t WHERE LOWER(a) = LOWER(@p0) AND b LIKE @p1 AND LOWER(c) LIKE LOWER(@p2)",
+        [("p0", "x"), ("p1", "y%"), ("p2", "%z")],
+    )
+
+
+def test_parameterize_sql_leaves_other_literals_inline():
+    for query in (
+        "SELECT * FROM t WHERE post_date = '2024-01-01'",
+        "SELECT * FROM t WHERE SEARCH(job_title, 'Senior')",
+        "SELECT * FROM t WHERE note = \"LIKE 'x'\"",
+        "SELECT * FROM t WHERE LOWER(name) = LOWER('O\\'Brien')",
+        "SELECT * FROM `p.ds.like 'x'`",
+    ):
+        assert parameterize_sql(query) == (query, []), query
+
+
+def test_parameterize_sql_leaves_triple_quoted_and_prefixed_literals_inline():
+    for query in (
+        "SELECT * FROM t WHERE a LIKE '''x'''",
+        "SELECT * FROM t WHERE a LIKE \"\"\"it's\"\"\" AND LOWER(b) = LOWER('''y''')",
+        "SELECT * FROM t WHERE a LIKE r'\\d%'",
+        "SELECT * FROM t WHERE a LIKE b'x%'",
+    ):
+        assert parameterize_sql(query) == (query, []), query
+
+
+def test_parameterize_sql_binds_literals_after_a_triple_quoted_one():
+    assert parameterize_sql("SELECT '''a'b''' FROM t WHERE c LIKE 'x%'") == (
+        "SELECT '''a'b''' FROM t WHERE c LIKE @p0",
+        [("p0", "x%")],
+    )
+
+
+def test_canonicalize_sql_keeps_triple_quoted_literals_verbatim():
+    query = "SELECT '''it's  -- not\n a comment''' FROM t"
+    assert canonicalize_sql(query) == query
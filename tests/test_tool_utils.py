@@ -0,0 +1,102 @@
+import datetime
+import decimal
+
+from sql_utils import validate_query
+from tool_utils import (
+    GENERIC_ERROR_MESSAGE,
+    NO_RESULTS_MESSAGE,
+    build_query_response,
+    check_tool_response,
+    get_root_exception,
+    lookup_error_message,
+    to_json_value,
+)
+
+
+def test_get_root_exception_follows_cause_chain():
+    root = ValueError("root")
+    middle = RuntimeError("middle")
+    middle.__cause__ = root
+    top = KeyError("top")
+    top.__cause__ = middle
+    assert get_root_exception(top) is root
+    assert get_root_exception(root) is root
+
+
+def test_get_root_exception_stops_on_cycle():
+    first = ValueError("first")
+    second = RuntimeError("second")
+    first.__cause__ = second
+    second.__cause__ = first
+    assert get_root_exception(first) is second
+
+
+def test_lookup_error_message_uses_most_specific_type():
+    class Base(Exception):
+        pass
+
+    class Child(Base):
+        pass
+
+    class Grandchild(Child):
+        pass
+
+    messages = {Base: "base", Child: "child"}
+    assert lookup_error_message(Grandchild(), messages, "default") == "child"
+    assert lookup_error_message(Base(), messages, "default") == "base"
+    assert lookup_error_message(ValueError(), messages, "default") == "default"
+
+
+def test_to_json_value_converts_dates_and_decimals():
+    assert to_json_value(datetime.date(2024, 1, 2)) == "2024-01-02"
+    assert to_json_value(datetime.datetime(2024, 1, 2, 3, 4)) == "2024-01-02T03:04:00"
+    assert to_json_value(decimal.Decimal("1.5")) == 1.5
+    assert to_json_value("x") == "x"
+
+
+def test_to_json_value_encodes_bytes_and_recurses_into_arrays_and_structs():
+    assert to_json_value(b"\x00\xff") == "AP8="
+    assert to_json_value([decimal.Decimal("1.5"), None]) == [1.5, None]
+    assert to_json_value({"d": datetime.date(2024, 1, 2), "tags": [b"a"]}) == {"d": "2024-01-02", "tags": ["YQ=="]}
+
+
+def test_build_query_response_returns_columns_and_rows():
+    assert build_query_response(["a", "b"], [(1, decimal.Decimal("2.5"))], 1) == {
+        "columns": ["a", "b"],
+        "rows": [[1, 2.5]],
+    }
+
+
+def test_build_query_response_flags_truncated_unbounded_query():
+    # validate_query adds no LIMIT, so BigQuery reports every matching row in
+    # total_rows while only the first page is fetched.
+    assert "LIMIT" not in validate_query("SELECT * FROM t")
+    response = build_query_response(["a"], [(i,) for i in range(1000)], 50000)
+    assert len(response["rows"]) == 1000
+    assert response["total_rows"] == 50000
+    assert response["truncated"] is True
+
+
+def test_build_query_response_does_not_flag_complete_results():
+    response = build_query_response(["a"], [(1,), (2,)], 2)
+    assert "truncated" not in response
+    assert "total_rows" not in response
+
+
+def test_check_tool_response_passes_results_through():
+    assert check_tool_response({"columns": ["a"], "rows": [[1]]}) is None
+    assert check_tool_response([{"a": 1}]) is None
+    assert check_tool_response("text") is None
+
+
+def test_check_tool_response_replaces_empty_results():
+    assert check_tool_response({"columns": ["a"], "rows": []}) == {"message": NO_RESULTS_MESSAGE}
+    assert check_tool_response([]) == {"message": NO_RESULTS_MESSAGE}
+
+
+def test_check_tool_response_handles_errors():
+    error = {"error_message": "already handled"}
+    assert check_tool_response(error) is error
+    assert check_tool_response({"status": "ERROR", "error_details": "boom"}) == {
+        "error_message": GENERIC_ERROR_MESSAGE
+    }
@@ -0,0 +1,103 @@
+"""Helpers for turning tool results and errors into what the model is shown."""
+import base64
+import datetime
+import decimal
+import functools
+import logging
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+_LOGGER = logging.getLogger(__name__)
+
+GENERIC_ERROR_MESSAGE = (
+    "I encountered an error while trying to query the database. "
+    "Please try rephrasing your request."
+)
+NO_RESULTS_MESSAGE = (
+    "I couldn't find any information matching your criteria in the database. "
+    "Please try a different search or broaden your criteria."
+)
+
+
+def get_root_exception(e: BaseException) -> BaseException:
+    """Unwraps an exception's __cause__ chain to find the root cause, stopping
+    if the chain loops back on itself."""
+    seen = {id(e)}
+    while e.__cause__ is not None and id(e.__cause__) not in seen:
+        e = e.__cause__
+        seen.add(id(e))
+    return e
+
+
+def lookup_error_message(e: BaseException, messages: Mapping[type, str], default: str) -> str:
+    """Returns the message for the most specific type in the exception's MRO
+    that has one, or the default."""
+    for exception_type in type(e).__mro__:
+        message = messages.get(exception_type)
+        if message is not None:
+            return message
+    return default
+
+
+def to_json_value(value: Any) -> Any:
+    """Converts a BigQuery row value into something the tool response can carry,
+    recursing into ARRAY and STRUCT values."""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        # BYTES columns, e.g. hashes, are returned the way BigQuery prints them.
+        return base64.b64encode(value).decode("ascii")
+    if isinstance(value, list):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_json_value(item) for key, item in value.items()}
+    return value
+
+
+def build_query_response(
+    columns: List[str], rows: Iterable[Sequence[Any]], total_rows: Optional[int]
+) -> Dict[str, Any]:
+    """Returns fetched query results as column names and rows of values. If
+    fewer rows were fetched than matched, total_rows holds the full count and
+    truncated is true."""
+    # Column names are sent once, and each row as a plain list of values,
+    # rather than a dict per row repeating every column name.
+    response = {"columns": columns, "rows": [[to_json_value(value) for value in row] for row in rows]}
+    if total_rows is not None and total_rows > len(response["rows"]):
+        response["total_rows"] = total_rows
+        response["truncated"] = True
+    return response
+
+
+@functools.singledispatch
+def check_tool_response(tool_response: Any) -> Optional[Dict[str, Any]]:
+    """Returns the response to send instead of an error or empty tool response,
+    or None if the response holds results. Dispatches on the response type."""
+    return None
+
+
+@check_tool_response.register
+def _(tool_response: dict) -> Optional[Dict[str, Any]]:
+    # Errors were already turned into a user-facing message by the error callback.
+    if "error_message" in tool_response:
+        return tool_response
+
+    # Handle errors returned by the BigQuery tool.
+    if tool_response.get("status") == "ERROR":
+        error_details = tool_response.get("error_details", "Unknown error")
+        _LOGGER.error("BigQuery tool returned an error: %s", error_details)
+        return {"error_message": GENERIC_ERROR_MESSAGE}
+
+    # Handle empty results for SELECT queries.
+    if tool_response.get("rows") == []:
+        return {"message": NO_RESULTS_MESSAGE}
+    return None
+
+
+@check_tool_response.register
+def _(tool_response: list) -> Optional[Dict[str, Any]]:
+    # Handle empty results when the response is a list.
+    if not tool_response:
+        return {"message": NO_RESULTS_MESSAGE}
+    return None